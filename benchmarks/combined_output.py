@@ -0,0 +1,55 @@
+"""Compare output size, embedded fonts and time of per-invoice PDFs against one combined PDF.
+
+Usage: python benchmarks/combined_output.py [--groups 500]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weasyprint import HTML  # noqa: E402
+
+import main  # noqa: E402
+from stylesheet_cache import build_pages  # noqa: E402
+
+
+def embedded_fonts(document) -> int:
+    """Number of font files embedded by the last write_pdf of document."""
+    return len({font.hash for font in document.fonts.values()})
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', type=int, default=500)
+    args = parser.parse_args()
+
+    pages = build_pages(args.groups)
+    stylesheets, font_config = main.load_stylesheets(ROOT / 'style.css')
+
+    start = time.perf_counter()
+    separate_bytes = separate_fonts = 0
+    for html_out in pages:
+        document = HTML(string=html_out).render(stylesheets=stylesheets, font_config=font_config)
+        separate_bytes += len(document.write_pdf())
+        separate_fonts += embedded_fonts(document)
+    separate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    documents = [
+        HTML(string=html_out).render(stylesheets=stylesheets, font_config=font_config) for html_out in pages
+    ]
+    combined = documents[0].copy([page for document in documents for page in document.pages])
+    combined_bytes = len(combined.write_pdf())
+    combined_fonts = embedded_fonts(combined)
+    combined_time = time.perf_counter() - start
+
+    print(f"{len(pages)} invoices")
+    print(f"  separate PDFs: {separate_bytes / 1024:.0f} KiB, {separate_fonts} embedded fonts, {separate_time:.1f} s")
+    print(f"  combined PDF:  {combined_bytes / 1024:.0f} KiB, {combined_fonts} embedded fonts, {combined_time:.1f} s")
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,174 @@
+"""Stress test invoice number allocation from many concurrent processes.
+
+Each process repeatedly reserves a block of numbers, journals every number as issuing and then
+issued, and completes the reservation, all against one shared counter directory. With --crash-rate,
+processes also die with os._exit() partway through a run, after journaling some of its numbers.
+A crashed process is restarted (up to --max-restarts times) and repeats the run it died in, while
+the other processes abandon its reservation or it resumes it, whichever comes first; runs left
+open after the last restart are finished by a final pass in this process.
+
+Every journaled number is logged with its file, and the run fails if a number is carried by two
+different files, if any file never ends up issued or if the journal is left with open reservations.
+Without crashes it also fails if the issued numbers leave a gap.
+
+Usage: python benchmarks/counter_stress.py [--processes 32] [--runs 20] [--max-block 50]
+                                           [--crash-rate 0.1] [--max-restarts 1]
+"""
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+CRASHED = 86
+
+
+def allocate(workdir, worker, first_run, runs, max_block, crash_rate, attempt):
+    """Run worker's runs from first_run on, logging every journaled number to a file in workdir."""
+    os.chdir(workdir)
+    crash_rng = random.Random(f"{worker}-{attempt}")
+
+    with open(f"numbers-{worker}-{attempt}.log", 'a') as log:
+        for run in range(first_run, runs):
+            Path(f"worker-{worker}.run").write_text(str(run))
+
+            # A repeated run asks for the same block, so it can resume its reservation
+            count = random.Random(f"{worker}-{run}").randint(1, max_block)
+            run_key = f"worker-{worker}-run-{run}"
+            reservation = main.reserve_invoice_numbers(run_key, count)
+            if reservation.resumed:
+                log.write(f"resumed {run_key}\n")
+                log.flush()
+
+            # Die before journaling the crash_at'th number, or after it is issuing but not issued
+            crash_at = crash_rng.randint(0, count) if crash_rng.random() < crash_rate else None
+            crash_while_issuing = crash_rng.random() < 0.5
+
+            for index in range(count):
+                number = reservation.start + index
+                filename = f"{run_key}-{index}.pdf"
+                if number in reservation.issued:
+                    continue
+                if index == crash_at and not crash_while_issuing:
+                    os._exit(CRASHED)
+
+                main.record_issuing_number(reservation, number, filename)
+                log.write(f"issuing {number} {filename}\n")
+                log.flush()
+                if index == crash_at:
+                    os._exit(CRASHED)
+
+                main.record_issued_number(reservation, number, filename)
+                log.write(f"issued {number} {filename}\n")
+                log.flush()
+
+            if crash_at == count:
+                os._exit(CRASHED)
+            main.complete_reservation(reservation)
+
+
+def run_workers(workdir, args) -> tuple:
+    """Run every worker to completion, restarting crashed ones; return (crashes, runs left open)."""
+    def start(worker, first_run, attempt):
+        process = multiprocessing.Process(
+            target=allocate,
+            args=(workdir, worker, first_run, args.runs, args.max_block, args.crash_rate, attempt),
+        )
+        process.start()
+        return process
+
+    running = {start(worker, 0, 0): (worker, 0) for worker in range(args.processes)}
+    crashes = 0
+    left_open = []
+    while running:
+        for sentinel in multiprocessing.connection.wait([process.sentinel for process in running]):
+            process = next(process for process in running if process.sentinel == sentinel)
+            worker, attempt = running.pop(process)
+            process.join()
+            if process.exitcode == 0:
+                continue
+            if process.exitcode != CRASHED:
+                raise SystemExit(f"worker {worker} failed with exit code {process.exitcode}")
+
+            crashes += 1
+            crashed_run = int((Path(workdir) / f"worker-{worker}.run").read_text())
+            if attempt < args.max_restarts:
+                running[start(worker, crashed_run, attempt + 1)] = (worker, attempt + 1)
+            else:
+                left_open.append((worker, crashed_run))
+    return crashes, left_open
+
+
+def main_stress():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=32)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--max-block', type=int, default=50)
+    parser.add_argument('--crash-rate', type=float, default=0.1, help='Chance that a run crashes partway')
+    parser.add_argument('--max-restarts', type=int, default=1, help='Restarts of each crashed worker')
+    args = parser.parse_args()
+
+    root = Path(__file__).resolve().parent.parent
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        crashes, left_open = run_workers(workdir, args)
+
+        # Finish the runs whose worker crashed for the last time
+        for worker, run in left_open:
+            allocate(workdir, worker, run, args.runs, args.max_block, 0, 'final')
+        elapsed = time.perf_counter() - start
+
+        os.chdir(workdir)
+        next_number = main.get_next_invoice_number()
+        leftover_journal = main._open_reservations(main._read_journal())
+        events = [
+            line.split() for log in sorted(Path(workdir).glob('numbers-*.log')) for line in log.read_text().splitlines()
+        ]
+        os.chdir(root)
+
+    files_by_number = {}
+    issued_files = set()
+    for event, *fields in events:
+        if event == 'resumed':
+            continue
+        number, filename = int(fields[0]), fields[1]
+        files_by_number.setdefault(number, set()).add(filename)
+        if event == 'issued':
+            issued_files.add(filename)
+    expected_files = {
+        f"worker-{worker}-run-{run}-{index}.pdf"
+        for worker in range(args.processes)
+        for run in range(args.runs)
+        for index in range(random.Random(f"{worker}-{run}").randint(1, args.max_block))
+    }
+    shared = {number: files for number, files in files_by_number.items() if len(files) > 1}
+    numbers = sorted(files_by_number)
+    resumed = sum(event == 'resumed' for event, *_ in events)
+
+    print(
+        f"{args.processes} processes x {args.runs} runs: {len(issued_files)} invoices, "
+        f"{len(numbers)} numbers in {elapsed:.2f} s"
+    )
+    print(f"{crashes} crash(es), {resumed} resumed run(s), {len(left_open)} finished by the final pass")
+    print(f"{next_number - 1 - len(numbers)} number(s) skipped after crashes")
+
+    assert not shared, f"{len(shared)} number(s) carried by more than one file, e.g. {next(iter(shared.items()))}"
+    assert issued_files == expected_files, f"{len(expected_files - issued_files)} invoice(s) never issued"
+    assert numbers[-1] < next_number, f"counter is {next_number}, but {numbers[-1]} was issued"
+    assert not leftover_journal, "journal still has open reservations"
+    if not crashes:
+        assert numbers == list(range(1, len(numbers) + 1)), "issued numbers are not contiguous"
+        assert next_number == len(numbers) + 1, f"counter is {next_number}, expected {len(numbers) + 1}"
+    print("OK: no number carried by two files" + ("" if crashes else ", no gaps"))
+
+
+if __name__ == '__main__':
+    main_stress()
@@ -0,0 +1,51 @@
+"""Compare read_invoice with pandas' C parser and the pyarrow engine on a large synthetic export.
+
+Usage: python benchmarks/csv_engines.py [--patients 5000] [--years 5]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+from synthetic_csv import write_synthetic_csv  # noqa: E402
+
+
+def time_read(csv_path: Path, engine: str, repeat: int = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = main.read_invoice(csv_path, engine=engine)
+        best = min(best, time.perf_counter() - start)
+    return best, df
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / 'visits.csv'
+        write_synthetic_csv(csv_path, patients=args.patients, months=args.years * 12)
+        size_mb = csv_path.stat().st_size / 1024 / 1024
+
+        c_time, c_df = time_read(csv_path, 'c')
+        arrow_time, arrow_df = time_read(csv_path, 'pyarrow')
+
+    # Both engines must agree as printed on an invoice, including leading zeros in the string
+    # columns and how missing values show up
+    as_printed = lambda df: df.astype(object).astype(str)  # noqa: E731
+    assert as_printed(c_df).equals(as_printed(arrow_df)), "engines produced different frames"
+
+    print(f"{size_mb:.0f} MB CSV, {len(c_df)} rows")
+    print(f"  c:       {c_time:.2f} s")
+    print(f"  pyarrow: {arrow_time:.2f} s ({c_time / arrow_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,89 @@
+"""Summarise the startup cost of main.py from `python -X importtime`.
+
+Reports the cumulative import time of main, its heaviest direct imports, and whether pandas, jinja2
+or weasyprint were loaded, along with the wall time of `main.py --help`. With --max-ms the script
+exits non-zero when importing main takes longer, so startup regressions show up in CI.
+
+Usage: python benchmarks/import_time.py [--repeat 5] [--top 10] [--max-ms 150]
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ['pandas', 'jinja2', 'weasyprint']
+
+
+def import_times(code: str) -> list:
+    """Run code in a fresh interpreter and return its (module, self_us, cumulative_us, depth) lines.
+
+    -X importtime reports each module after everything it imported, so a module's imports are the
+    deeper lines just before its own.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, check=True, capture_output=True, text=True
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return times
+
+
+def direct_imports(times: list, module: str) -> list:
+    """(name, cumulative_us) of the modules imported directly by module."""
+    end = next(i for i, (name, *_) in enumerate(times) if name == module)
+    depth = times[end][3]
+    start = end
+    while start > 0 and times[start - 1][3] > depth:
+        start -= 1
+    return [(name, cumulative_us) for name, _, cumulative_us, d in times[start:end] if d == depth + 1]
+
+
+def help_wall_time() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py', '--help'], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the fastest is reported')
+    parser.add_argument('--top', type=int, default=10, help='Number of direct imports of main to list')
+    parser.add_argument('--max-ms', type=float, default=None, help='Fail if importing main takes longer')
+    args = parser.parse_args()
+
+    # Keep the fastest run, the one least disturbed by other processes and cold disk caches
+    runs = [import_times('import main') for _ in range(args.repeat)]
+    main_cumulative = lambda times: next(line[2] for line in times if line[0] == 'main')  # noqa: E731
+    times = min(runs, key=main_cumulative)
+    main_ms = main_cumulative(times) / 1000
+
+    print(f"import main: {main_ms:.1f} ms cumulative")
+
+    direct = direct_imports(times, 'main')
+    print("\nHeaviest imports under main:")
+    for name, cumulative_us in sorted(direct, key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    print("\nHeavy dependencies loaded at import:")
+    for module in HEAVY_MODULES:
+        loaded = any(name == module for name, *_ in times)
+        print(f"  {module:<12} {'yes' if loaded else 'no'}")
+
+    help_s = min(help_wall_time() for _ in range(args.repeat))
+    print(f"\nmain.py --help: {help_s * 1000:.0f} ms wall")
+
+    if args.max_ms is not None and main_ms > args.max_ms:
+        raise SystemExit(f"import main took {main_ms:.1f} ms, over the {args.max_ms:.1f} ms budget")
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,69 @@
+"""Compare peak memory of a full read_invoice against streaming chunked ingest.
+
+Each mode runs in a fresh subprocess and reports its peak resident set size.
+
+Usage: python benchmarks/ingest_memory.py [--patients 2000] [--years 5] [--chunksize 50000]
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from synthetic_csv import write_synthetic_csv  # noqa: E402
+
+MONTH = '2021-06'
+
+
+def run_child(csv_path: Path, chunksize: int):
+    import main
+
+    start = time.perf_counter()
+    df = main.read_invoice(csv_path, MONTH, chunksize)
+    groups = main.group_by_patient_month(df, MONTH)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{len(groups)}\t{elapsed:.2f}\t{peak_mb:.0f}")
+
+
+def measure(csv_path: Path, chunksize):
+    cmd = [sys.executable, __file__, '--child', str(csv_path)]
+    if chunksize:
+        cmd += ['--chunksize', str(chunksize)]
+    output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    groups, elapsed, peak_mb = output.strip().splitlines()[-1].split('\t')
+    return int(groups), float(elapsed), float(peak_mb)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--chunksize', type=int, default=None, help='Rows per chunk (default: 50000)')
+    parser.add_argument('--child', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.chunksize)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / 'visits.csv'
+        write_synthetic_csv(csv_path, patients=args.patients, months=args.years * 12)
+        size_mb = csv_path.stat().st_size / 1024 / 1024
+        print(f"{size_mb:.0f} MB CSV, groups for {MONTH}")
+
+        chunksize = args.chunksize or 50000
+        for label, chunksize in [('full read', None), (f'chunks of {chunksize}', chunksize)]:
+            groups, elapsed, peak_mb = measure(csv_path, chunksize)
+            print(f"  {label:<20} {groups} groups  {elapsed:.2f} s  peak RSS {peak_mb:.0f} MB")
+
+
+if __name__ == '__main__':
+    main_benchmark()
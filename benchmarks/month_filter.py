@@ -0,0 +1,57 @@
+"""Compare filtering groups after grouping with pushing the --month filter down before groupby.
+
+Usage: python benchmarks/month_filter.py [--patients 500] [--years 5]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+from synthetic_csv import write_synthetic_csv  # noqa: E402
+
+
+def group_then_filter(df, month_filter):
+    """The previous approach: group every month, then keep the requested one."""
+    df['parsed_date'] = main.parse_dates(df['Date'])
+    df['year_month'] = df['parsed_date'].dt.to_period('M')
+    groups = [(name, group) for name, group in df.groupby(['Patient name', 'year_month'], observed=True)]
+    return [(key, group) for key, group in groups if str(key[1]) == month_filter]
+
+
+def time_it(fn, df, month_filter, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        groups = fn(frame, month_filter)
+        best = min(best, time.perf_counter() - start)
+    return best, len(groups)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=500)
+    parser.add_argument('--years', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / 'visits.csv'
+        write_synthetic_csv(csv_path, patients=args.patients, months=args.years * 12)
+        df = main.read_invoice(csv_path)
+
+    month_filter = '2021-06'
+    before, n_before = time_it(group_then_filter, df, month_filter)
+    after, n_after = time_it(main.group_by_patient_month, df, month_filter)
+    assert n_before == n_after
+
+    print(f"{len(df)} rows, {n_after} groups in {month_filter}")
+    print(f"  group then filter: {before * 1000:.1f} ms")
+    print(f"  filter then group: {after * 1000:.1f} ms ({before / after:.1f}x)")
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,119 @@
+"""Time generate_invoices_from_csv end to end, per stage, on a synthetic visit CSV.
+
+Results can be saved and compared against a previous run:
+
+    python benchmarks/run_benchmarks.py --patients 200 --months 3 --save before.json
+    # ... change something ...
+    python benchmarks/run_benchmarks.py --patients 200 --months 3 --compare before.json
+
+Any further generate_invoices_from_csv options (--month, --workers, --combined, ...) are passed through.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import main  # noqa: E402
+from synthetic_csv import write_synthetic_csv  # noqa: E402
+
+# Every invoice needs the practice details; fill in placeholders for any missing from .env
+for env_var in main.PRACTICE_ENV_VARS.values():
+    os.environ.setdefault(env_var, 'Benchmark')
+
+
+def run(args) -> dict:
+    """Run one end-to-end generation in a scratch directory and return per-stage totals."""
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        # The template and the invoice counter are looked up relative to the working directory
+        shutil.copy(ROOT / 'invoice_template.html', workdir)
+        shutil.copy(ROOT / 'style.css', workdir)
+
+        csv_path = workdir / 'visits.csv'
+        write_synthetic_csv(
+            csv_path,
+            patients=args.patients,
+            months=args.months,
+            visits_per_month=args.visits_per_month,
+            medical_aid_density=args.medical_aid_density,
+            next_of_kin_density=args.next_of_kin_density,
+        )
+
+        trace_path = workdir / 'trace.json'
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                main.generate_invoices_from_csv(
+                    csv_path,
+                    output_dir=workdir / 'output',
+                    month_filter=args.month,
+                    workers=args.workers,
+                    chunksize=args.chunksize,
+                    csv_engine=args.csv_engine,
+                    combined=args.combined,
+                    profile_json=trace_path,
+                )
+            total = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+        records = json.loads(trace_path.read_text())['records']
+
+    stages = {}
+    for record in records:
+        stages[record['phase']] = stages.get(record['phase'], 0) + record['wall']
+    invoices = len({record['invoice'] for record in records if record['phase'] == 'transform'})
+    return {'total': total, 'invoices': invoices, 'stages': stages}
+
+
+def report(result: dict, baseline: dict = None):
+    def change(now, before):
+        if not before:
+            return ''
+        return f"{(now - before) / before * 100:+8.1f}%"
+
+    base_stages = baseline['stages'] if baseline else {}
+    print(f"{'Stage':<16}{'Wall s':>10}{'vs base':>10}")
+    for stage, wall in result['stages'].items():
+        print(f"{stage:<16}{wall:>10.3f}{change(wall, base_stages.get(stage)):>10}")
+    print(f"{'end to end':<16}{result['total']:>10.3f}{change(result['total'], baseline and baseline['total']):>10}")
+    print(f"\n{result['invoices']} invoice(s), {result['invoices'] / result['total']:.1f} invoices/s")
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--months', type=int, default=3)
+    parser.add_argument('--visits-per-month', type=int, default=2)
+    parser.add_argument('--medical-aid-density', type=float, default=0.6)
+    parser.add_argument('--next-of-kin-density', type=float, default=0.4)
+    parser.add_argument('--month', default=None, help='Only generate this YYYY-MM (default: every month)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunksize', type=int, default=None)
+    parser.add_argument('--csv-engine', default='c', choices=['c', 'pyarrow'])
+    parser.add_argument('--combined', action='store_true')
+    parser.add_argument('--save', type=Path, help='Write the results to this JSON file')
+    parser.add_argument('--compare', type=Path, help='Compare against results saved with --save')
+    args = parser.parse_args()
+
+    result = run(args)
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    report(result, baseline)
+
+    if args.save:
+        args.save.write_text(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main_benchmark()
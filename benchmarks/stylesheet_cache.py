@@ -0,0 +1,60 @@
+"""Compare per-invoice render time with and without a cached WeasyPrint stylesheet.
+
+Usage: python benchmarks/stylesheet_cache.py [--groups 1000]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from weasyprint import HTML  # noqa: E402
+
+import main  # noqa: E402
+from synthetic_csv import write_synthetic_csv  # noqa: E402
+
+
+def build_pages(groups: int):
+    """Render the HTML for `groups` patient-month invoices."""
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / 'visits.csv'
+        write_synthetic_csv(csv_path, patients=groups, months=1)
+        df = main.read_invoice(csv_path)
+
+    template = main.load_template(ROOT / 'invoice_template.html')
+    pages = []
+    for i, ((_, year_month), group_df) in enumerate(main.group_by_patient_month(df)):
+        data = main.transform_group_to_invoice_data(group_df, f"INV-{i + 1:04d}", year_month)
+        pages.append(template.render(**data))
+    return pages
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', type=int, default=1000)
+    args = parser.parse_args()
+
+    pages = build_pages(args.groups)
+    css_path = ROOT / 'style.css'
+
+    start = time.perf_counter()
+    for html_out in pages:
+        HTML(string=html_out).write_pdf(stylesheets=[str(css_path)])
+    before = (time.perf_counter() - start) / len(pages)
+
+    stylesheets, font_config = main.load_stylesheets(css_path)
+    start = time.perf_counter()
+    for html_out in pages:
+        HTML(string=html_out).write_pdf(stylesheets=stylesheets, font_config=font_config)
+    after = (time.perf_counter() - start) / len(pages)
+
+    print(f"{len(pages)} invoices")
+    print(f"  path stylesheet:   {before * 1000:.1f} ms/invoice")
+    print(f"  cached stylesheet: {after * 1000:.1f} ms/invoice ({before / after:.2f}x)")
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,108 @@
+"""Generate synthetic visit CSVs in the format read_invoice expects.
+
+Usage: python benchmarks/synthetic_csv.py OUT.csv [--patients 100] [--months 12] [--visits-per-month 2]
+"""
+import argparse
+import csv
+import random
+from pathlib import Path
+
+COLUMNS = [
+    'Date',
+    'Patient name',
+    'Patient address',
+    'Cell number',
+    'Email',
+    'Medical aid name',
+    'Medical aid number',
+    'Next of kin name',
+    'Next of kin cellphone number',
+    'Next of kin email',
+    'Second next of kin name',
+    'Second next of kin cellphone number',
+    'Second next of kin email',
+    'P. Code',
+    'ICD Code',
+    # Not used by the invoice; stands in for the free-text columns real exports carry
+    'Notes',
+]
+
+MEDICAL_AIDS = ['Discovery', 'Bonitas', 'Momentum', 'Medshield', 'Fedhealth']
+P_CODES = ['0190', '0191', '0192', '0141', '0142']
+ICD_CODES = ['J06.9', 'I10', 'E11.9', 'M54.5', 'F32.9', 'Z00.0']
+
+
+def write_synthetic_csv(path: Path, patients: int = 100, months: int = 12, visits_per_month: int = 2,
+                        start_year: int = 2021, seed: int = 0, medical_aid_density: float = 0.6,
+                        next_of_kin_density: float = 0.4, second_next_of_kin_density: float = 0.3):
+    """Write a CSV with one group per patient per month.
+
+    Produces `patients * months` patient-month groups of `visits_per_month` rows each. The densities
+    are the fraction of patients with a medical aid, a next of kin and (of those with a next of kin)
+    a second next of kin.
+    """
+    rng = random.Random(seed)
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+
+        for p in range(patients):
+            name = f"Patient {p:05d}"
+            has_aid = rng.random() < medical_aid_density
+            has_kin = rng.random() < next_of_kin_density
+            has_second_kin = has_kin and rng.random() < second_next_of_kin_density
+            details = [
+                name,
+                f"{p} Long Street\nCape Town\n8001",
+                f"08{rng.randint(0, 99999999):08d}",
+                f"patient{p}@example.com",
+                rng.choice(MEDICAL_AIDS) if has_aid else '',
+                f"00{rng.randint(0, 9999999):07d}" if has_aid else '',
+                f"Kin of {name}" if has_kin else '',
+                f"07{rng.randint(0, 99999999):08d}" if has_kin else '',
+                f"kin{p}@example.com" if has_kin else '',
+                f"Second kin of {name}" if has_second_kin else '',
+                f"06{rng.randint(0, 99999999):08d}" if has_second_kin else '',
+                '',
+            ]
+
+            for m in range(months):
+                year = start_year + m // 12
+                month = m % 12 + 1
+                for day in sorted(rng.sample(range(1, 29), visits_per_month)):
+                    writer.writerow(
+                        [f"{day:02d}/{month:02d}/{year}", *details, rng.choice(P_CODES), rng.choice(ICD_CODES),
+                         f"Follow-up visit {day} for {name}, reviewed history and medication"]
+                    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', type=Path)
+    parser.add_argument('--patients', type=int, default=100)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--visits-per-month', type=int, default=2)
+    parser.add_argument('--start-year', type=int, default=2021)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--medical-aid-density', type=float, default=0.6)
+    parser.add_argument('--next-of-kin-density', type=float, default=0.4)
+    parser.add_argument('--second-next-of-kin-density', type=float, default=0.3)
+    args = parser.parse_args()
+
+    write_synthetic_csv(
+        args.output,
+        patients=args.patients,
+        months=args.months,
+        visits_per_month=args.visits_per_month,
+        start_year=args.start_year,
+        seed=args.seed,
+        medical_aid_density=args.medical_aid_density,
+        next_of_kin_density=args.next_of_kin_density,
+        second_next_of_kin_density=args.second_next_of_kin_density,
+    )
+    print(f"Wrote {args.patients * args.months * args.visits_per_month} visit(s) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,124 @@
+from __future__ import annotations
+
 import argparse
+import fcntl
+import hashlib
+import importlib.util
+import json
 import os
+import queue
+import re
+import stat
+import tempfile
+import threading
+import time
+import zipfile
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
 from dotenv import load_dotenv
-from jinja2 import Template
-from weasyprint import HTML
+
+# pandas, jinja2 and weasyprint take most of a run's startup time, so they are imported by the
+# functions that use them; --help and months without data never load WeasyPrint's font stack.
+# asyncio, only needed by --pipeline, is deferred the same way.
+if TYPE_CHECKING:
+    import pandas as pd
+    from jinja2 import Template
 
 load_dotenv()
 
 
-def parse_date(date_str: str) -> datetime:
-    """Parse DD/MM/YYYY format to datetime."""
-    return datetime.strptime(date_str, "%d/%m/%Y")
+class InvoiceDataError(ValueError):
+    """Raised when the input CSV contains values that cannot be invoiced."""
+
+
+class InvoiceCounterError(RuntimeError):
+    """Raised when invoice numbers cannot be allocated safely."""
+
+
+class InvoiceSettingsError(ValueError):
+    """Raised when practice details required on every invoice are missing from the environment."""
+
+
+class Profiler:
+    """Record wall-clock and CPU time per phase, optionally per invoice.
+
+    A disabled profiler records nothing, so callers can time phases unconditionally.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.records = []
+
+    @contextmanager
+    def phase(self, name: str, invoice: str = None):
+        if not self.enabled:
+            yield
+            return
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.records.append({
+                'phase': name,
+                'invoice': invoice,
+                'wall': time.perf_counter() - wall_start,
+                'cpu': time.process_time() - cpu_start,
+            })
+
+    def summary(self, slowest: int = 5) -> str:
+        """Format a per-phase table (total, p50, p95, max) and the slowest invoices."""
+        def percentile(values, p):
+            return values[min(len(values) - 1, round(p * (len(values) - 1)))]
+
+        phases = {}
+        for record in self.records:
+            phases.setdefault(record['phase'], []).append(record)
+
+        lines = [f"{'Phase':<16}{'Count':>7}{'Wall s':>10}{'CPU s':>10}{'p50 ms':>10}{'p95 ms':>10}{'Max ms':>10}"]
+        for name, records in phases.items():
+            walls = sorted(record['wall'] for record in records)
+            lines.append(
+                f"{name:<16}{len(records):>7}{sum(walls):>10.2f}{sum(r['cpu'] for r in records):>10.2f}"
+                f"{percentile(walls, 0.5) * 1000:>10.1f}{percentile(walls, 0.95) * 1000:>10.1f}{walls[-1] * 1000:>10.1f}"
+            )
+
+        per_invoice = {}
+        for record in self.records:
+            if record['invoice'] is not None:
+                per_invoice[record['invoice']] = per_invoice.get(record['invoice'], 0) + record['wall']
+        if per_invoice:
+            lines.append("\nSlowest invoices:")
+            for invoice, wall in sorted(per_invoice.items(), key=lambda item: item[1], reverse=True)[:slowest]:
+                lines.append(f"  {wall * 1000:8.1f} ms  {invoice}")
+
+        return "\n".join(lines)
+
+    def write_json(self, path: Path):
+        with open(path, 'w') as f:
+            json.dump({'records': self.records}, f, indent=2)
+
+
+def parse_dates(dates: pd.Series) -> pd.Series:
+    """Parse a column of DD/MM/YYYY strings, reporting every malformed row in one go."""
+    import pandas as pd
+
+    parsed = pd.to_datetime(dates, format="%d/%m/%Y", errors='coerce')
+
+    invalid = parsed.isna()
+    if invalid.any():
+        # Row numbers as shown in a spreadsheet: the header is row 1
+        rows = ', '.join(f"{index + 2} ({value!r})" for index, value in dates[invalid].items())
+        raise InvoiceDataError(f"Invalid date(s), expected DD/MM/YYYY, in row(s): {rows}")
+
+    return parsed
 
 
 def sanitize_filename(name: str) -> str:
@@ -21,6 +126,13 @@ def sanitize_filename(name: str) -> str:
     return name.replace(" ", "_").replace("/", "-").replace("\\", "-")
 
 
+def invoice_filename(patient_name: str, year_month) -> str:
+    """PDF filename for a patient's invoice for year_month."""
+    safe_name = sanitize_filename(patient_name)
+    ym_str = str(year_month).replace('-', '_')
+    return f"invoice_{safe_name}_{ym_str}.pdf"
+
+
 def get_next_invoice_number() -> int:
     """Get the next invoice number from the counter file."""
     counter_file = Path(os.getcwd()) / "invoice_counter.txt"
@@ -31,163 +143,1359 @@ def get_next_invoice_number() -> int:
     return 1
 
 
+def _write_atomic(path: Path, text: str):
+    """Replace path with text so that a crash leaves either the old or the new contents."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
 def save_invoice_number(number: int):
-    """Save the last used invoice number to the counter file."""
-    counter_file = Path(os.getcwd()) / "invoice_counter.txt"
-    with open(counter_file, 'w') as f:
-        f.write(str(number))
-
-
-def read_invoice(path: Path):
-    # Specify dtype for columns that should be strings (to preserve leading zeros)
-    dtype_spec = {
-        'Cell number': str,
-        'Next of kin cellphone number': str,
-        'Second next of kin cellphone number': str,
-        'Medical aid number': str,
-        'P. Code': str,
-    }
-    df = pd.read_csv(path, dtype=dtype_spec)
+    """Save the next unused invoice number to the counter file."""
+    _write_atomic(Path(os.getcwd()) / "invoice_counter.txt", str(number))
+
+
+@dataclass
+class Reservation:
+    """A contiguous range of invoice numbers set aside for one run."""
+    run: str
+    start: int
+    count: int
+    pid: int = None
+    issued: set = field(default_factory=set)
+    issuing: set = field(default_factory=set)
+    resumed: bool = False
+    # Open run lock (see _lock_run) held while this process is generating the run's invoices
+    lock_file: object = field(default=None, repr=False)
+
+
+def _journal_path() -> Path:
+    return Path(os.getcwd()) / "invoice_journal.jsonl"
+
+
+@contextmanager
+def _counter_lock(exclusive: bool = True):
+    """Hold a lock on the counter and journal across processes.
+
+    Reservations and journal compaction take the lock exclusively; journal appends share it, so
+    concurrent runs can record issued numbers without waiting on each other.
+    """
+    with open(Path(os.getcwd()) / "invoice_counter.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _lock_run(run: str):
+    """Try to take the lock that the process generating run holds for as long as it runs.
+
+    Returns the open lock file, or None if a live process holds it. Unlike a journaled PID, the lock
+    cannot outlive its process, so a crashed run can always be resumed or abandoned. Callers must
+    hold _counter_lock exclusively.
+    """
+    lock_path = Path(os.getcwd()) / ".invoice_runs" / f"{run}.lock"
+    lock_path.parent.mkdir(exist_ok=True)
+    lock_file = open(lock_path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _unlock_run(lock_file):
+    """Remove and release a run lock taken with _lock_run. Callers must hold _counter_lock exclusively."""
+    Path(lock_file.name).unlink(missing_ok=True)
+    lock_file.close()
+
+
+def _append_journal(entry: dict):
+    """Append an entry to the journal and flush it to disk before returning.
+
+    Callers must hold _counter_lock, at least shared.
+    """
+    with open(_journal_path(), 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_journal() -> list:
+    journal = _journal_path()
+    if not journal.exists():
+        return []
+
+    entries = []
+    with open(journal, 'r') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final line from a crash mid-append
+                continue
+    return entries
+
+
+def _open_reservations(entries: list) -> dict:
+    """Replay journal entries, returning reservations that were never completed, keyed by run."""
+    reservations = {}
+    for entry in entries:
+        if entry['event'] == 'reserve':
+            reservations[entry['run']] = Reservation(entry['run'], entry['start'], entry['count'], entry.get('pid'))
+        elif entry['event'] == 'resume' and entry['run'] in reservations:
+            reservations[entry['run']].pid = entry['pid']
+        elif entry['event'] == 'issuing' and entry['run'] in reservations:
+            reservations[entry['run']].issuing.add(entry['number'])
+        elif entry['event'] == 'issued' and entry['run'] in reservations:
+            reservations[entry['run']].issued.add(entry['number'])
+        elif entry['event'] in ('complete', 'abandoned'):
+            reservations.pop(entry['run'], None)
+    return reservations
+
+
+def reserve_invoice_numbers(run: str, count: int) -> Reservation:
+    """Reserve count consecutive invoice numbers for run.
+
+    The counter file is advanced past the whole range under an exclusive lock before any PDF is
+    rendered, so neither a crash nor a concurrent run can hand the same numbers out twice. If an
+    earlier attempt at the same run was interrupted, its reservation is resumed instead.
+    Interrupted reservations of other runs (whose process is gone) are abandoned, returning the
+    numbers after the last one journaled as issuing or issued to the counter when nothing was
+    reserved after them.
+    """
+    if count == 0:
+        return Reservation(run, get_next_invoice_number(), 0)
+
+    with _counter_lock():
+        open_reservations = _open_reservations(_read_journal())
+
+        previous = open_reservations.pop(run, None)
+        lock_file = _lock_run(run)
+        if lock_file is None:
+            owner = f"process {previous.pid}" if previous is not None else "another process"
+            raise InvoiceCounterError(f"These invoices are already being generated by {owner}")
+        if previous is not None and previous.count == count:
+            _append_journal({'event': 'resume', 'run': run, 'pid': os.getpid()})
+            previous.pid = os.getpid()
+            previous.resumed = True
+            previous.lock_file = lock_file
+            return previous
+        if previous is not None:
+            open_reservations[run] = previous
+
+        next_number = get_next_invoice_number()
+        for reservation in sorted(open_reservations.values(), key=lambda r: r.start, reverse=True):
+            # Reservations whose run lock is still held belong to a live process
+            other_lock = lock_file if reservation.run == run else _lock_run(reservation.run)
+            if other_lock is None:
+                continue
+            if reservation.start + reservation.count == next_number:
+                # Numbers that may already be on a written PDF are never handed out again
+                handed_out = reservation.issued | reservation.issuing
+                next_number = max(handed_out, default=reservation.start - 1) + 1
+            _append_journal({'event': 'abandoned', 'run': reservation.run})
+            if other_lock is not lock_file:
+                _unlock_run(other_lock)
+
+        _append_journal({'event': 'reserve', 'run': run, 'start': next_number, 'count': count, 'pid': os.getpid()})
+        save_invoice_number(next_number + count)
+    return Reservation(run, next_number, count, os.getpid(), lock_file=lock_file)
+
+
+def record_issuing_number(reservation: Reservation, number: int, filename: str):
+    """Journal that a PDF carrying number is about to be rendered and written.
+
+    Written before the PDF can reach the disk, so a crash between writing the PDF and journaling
+    it as issued cannot return its number to the counter.
+    """
+    reservation.issuing.add(number)
+    with _counter_lock(exclusive=False):
+        _append_journal({'event': 'issuing', 'run': reservation.run, 'number': number, 'file': filename})
+
+
+def record_issued_number(reservation: Reservation, number: int, filename: str):
+    """Journal that the PDF carrying number has been written."""
+    reservation.issued.add(number)
+    with _counter_lock(exclusive=False):
+        _append_journal({'event': 'issued', 'run': reservation.run, 'number': number, 'file': filename})
+
+
+def complete_reservation(reservation: Reservation):
+    """Mark a reservation as fully issued and drop finished runs from the journal."""
+    if reservation.count == 0:
+        return
+
+    with _counter_lock():
+        _append_journal({'event': 'complete', 'run': reservation.run})
+
+        # Keep only entries for runs that are still open
+        entries = _read_journal()
+        open_runs = _open_reservations(entries)
+        _write_atomic(_journal_path(), ''.join(json.dumps(e) + "\n" for e in entries if e['run'] in open_runs))
+
+        if reservation.lock_file is not None:
+            _unlock_run(reservation.lock_file)
+            reservation.lock_file = None
+
+
+def release_reservation(reservation: Reservation):
+    """Let go of an unfinished reservation, leaving it open for a later run to resume."""
+    if reservation.lock_file is None:
+        return
+    with _counter_lock():
+        _unlock_run(reservation.lock_file)
+        reservation.lock_file = None
+
+
+# Columns read by transform_group_to_invoice_data; everything else in the export is ignored
+INVOICE_COLUMNS = [
+    'Date',
+    'Patient name',
+    'Patient address',
+    'Cell number',
+    'Email',
+    'Medical aid name',
+    'Medical aid number',
+    'Next of kin name',
+    'Next of kin cellphone number',
+    'Next of kin email',
+    'Second next of kin name',
+    'Second next of kin cellphone number',
+    'Second next of kin email',
+    'P. Code',
+    'ICD Code',
+]
+
+# Columns whose values repeat across many rows, stored as categoricals to save memory
+CATEGORICAL_COLUMNS = ['Patient name', 'Medical aid name', 'P. Code', 'ICD Code']
+
+# Columns that should be read as strings (to preserve leading zeros)
+STRING_COLUMNS = [
+    'Cell number',
+    'Next of kin cellphone number',
+    'Second next of kin cellphone number',
+    'Medical aid number',
+    'P. Code',
+]
+
+
+def validate_month(month_filter: str) -> str:
+    """Check that month_filter is a month in YYYY-MM format, returning it unchanged."""
+    if not re.fullmatch(r'\d{4}-\d{2}', month_filter) or not 1 <= int(month_filter[5:]) <= 12:
+        raise InvoiceDataError(f"Invalid month {month_filter!r}, expected YYYY-MM (e.g. 2025-11)")
+    return month_filter
+
+
+def in_month(parsed_dates: pd.Series, month_filter: str) -> pd.Series:
+    """Boolean mask of the dates falling in month_filter ('YYYY-MM')."""
+    import pandas as pd
+
+    validate_month(month_filter)
+    period = pd.Period(month_filter, freq='M')
+    return (parsed_dates >= period.start_time) & (parsed_dates <= period.end_time)
+
+
+def _missing_as_nan(df: pd.DataFrame) -> pd.DataFrame:
+    """Represent missing strings as NaN, as pandas' C parser does.
+
+    Arrow and Parquet hand them back as None, which would print differently on an invoice
+    depending on how the CSV was read.
+    """
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].where(df[column].notna())
+    return df
+
+
+def _read_csv_pyarrow(path: Path) -> pd.DataFrame:
+    """Read the invoice columns with Arrow's multithreaded CSV reader.
+
+    Every column is read as a string so Arrow never infers numbers and drops leading zeros.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [column for column in header if column in INVOICE_COLUMNS]
+
+    table = pa_csv.read_csv(
+        path,
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=columns,
+            column_types={column: pa.string() for column in columns},
+            strings_can_be_null=True,
+        ),
+    )
+    return table.to_pandas()
+
+
+def read_invoice(path: Path, month_filter: str = None, chunksize: int = None, engine: str = 'c'):
+    """Read the invoice columns of the visits CSV.
+
+    With chunksize, the file is streamed in chunks of that many rows and, if month_filter is
+    given, only that month's rows are kept, so memory stays bounded by the retained rows rather
+    than the size of the export. engine='pyarrow' parses the whole file with Arrow instead of
+    pandas' C parser and does not support chunksize.
+    """
+    import pandas as pd
+
+    if engine == 'pyarrow':
+        if chunksize is not None:
+            raise ValueError("The pyarrow CSV engine does not support chunksize")
+        df = _missing_as_nan(_read_csv_pyarrow(path))
+        return df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df})
+
+    dtype_spec = {column: str for column in STRING_COLUMNS}
+    dtype_spec.update({column: 'category' for column in CATEGORICAL_COLUMNS})
+    usecols = lambda c: c in INVOICE_COLUMNS  # noqa: E731
+
+    if chunksize is None:
+        df = pd.read_csv(path, dtype=dtype_spec, usecols=usecols)
+        return df
+
+    chunks = []
+    for chunk in pd.read_csv(path, dtype=dtype_spec, usecols=usecols, chunksize=chunksize):
+        if month_filter:
+            chunk = chunk[in_month(parse_dates(chunk['Date']), month_filter)]
+        chunks.append(chunk)
+
+    if not chunks:
+        return pd.DataFrame(columns=INVOICE_COLUMNS)
+
+    # Chunks carry their own categories, so concatenating falls back to object columns
+    df = pd.concat(chunks)
+    return df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df})
+
+
+CSV_CACHE_DIR = ".invoice_cache"
+# Bump when the cached frame's layout changes, so older cache files are ignored
+CSV_CACHE_VERSION = 1
+
+
+def _csv_cache_path(csv_path: Path) -> Path:
+    """Cache file for csv_path, named after its location, size, mtime and the column types read."""
+    csv_stat = csv_path.stat()
+    path_key = hashlib.sha256(str(csv_path.resolve()).encode()).hexdigest()[:16]
+    spec = [CSV_CACHE_VERSION, INVOICE_COLUMNS, CATEGORICAL_COLUMNS, STRING_COLUMNS]
+    spec += [csv_stat.st_size, csv_stat.st_mtime_ns]
+    spec_key = hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+    return Path(os.getcwd()) / CSV_CACHE_DIR / f"{path_key}-{spec_key}.parquet"
+
+
+def read_invoice_cached(csv_path: Path, engine: str = 'c', profiler: Profiler = None) -> pd.DataFrame:
+    """Read the visits CSV with its dates parsed, through a Parquet cache in CSV_CACHE_DIR.
+
+    The cache is keyed by the CSV's size and modification time and the column types read, so
+    editing the CSV or the column spec forces a fresh parse. On a hit the typed, date-parsed frame
+    is loaded memory-mapped instead of parsing the text file again. Needs pyarrow.
+    """
+    import pandas as pd
+
+    profiler = profiler or Profiler(enabled=False)
+    cache_path = _csv_cache_path(csv_path)
+
+    if cache_path.exists():
+        with profiler.phase('read_csv'):
+            try:
+                df = _missing_as_nan(pd.read_parquet(cache_path, engine='pyarrow', memory_map=True))
+            except Exception:
+                # A damaged cache file, or one removed since it was found, just means parsing the CSV
+                df = None
+            if df is not None:
+                # Parquet has no type for a categorical without categories, e.g. a column with no values
+                return df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df})
+
+    with profiler.phase('read_csv'):
+        df = read_invoice(csv_path, engine=engine)
+    with profiler.phase('parse_dates'):
+        df['parsed_date'] = parse_dates(df['Date'])
+
+    with profiler.phase('cache_write'):
+        cache_path.parent.mkdir(exist_ok=True)
+        # Each writer gets its own temporary file, so concurrent runs missing the cache at the same
+        # time never write into one file; the last complete one to be renamed into place wins
+        fd, temp_name = tempfile.mkstemp(dir=cache_path.parent, prefix=cache_path.stem, suffix='.tmp')
+        os.close(fd)
+        try:
+            df.to_parquet(temp_name, engine='pyarrow', index=False)
+            os.replace(temp_name, cache_path)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+
+        # Entries for earlier versions of this CSV are stale now; this run's own entry is never removed
+        for stale in cache_path.parent.glob(f"{cache_path.name.split('-')[0]}-*.parquet"):
+            if stale.name != cache_path.name:
+                stale.unlink(missing_ok=True)
+
     return df
 
 
-def group_by_patient_month(df: pd.DataFrame):
-    """Group invoice data by patient name and month."""
-    # Parse dates and add year-month column
-    df['parsed_date'] = df['Date'].apply(parse_date)
-    df['year_month'] = df['parsed_date'].dt.to_period('M')
+class PatientMonthGroups:
+    """Patient-month groups of a DataFrame sorted by (Patient name, year_month).
+
+    Only the start and end row of each group are kept; iterating yields ((patient_name, year_month),
+    group_df) in the same order as DataFrame.groupby, with each group_df a row slice of the sorted
+    frame rather than a copy.
+    """
+
+    def __init__(self, df: pd.DataFrame, starts, ends):
+        self.df = df
+        self.starts = starts
+        self.ends = ends
 
-    # Group by patient name and year-month
-    grouped = df.groupby(['Patient name', 'year_month'])
+    def __len__(self):
+        return len(self.starts)
 
-    return [(name, group) for name, group in grouped]
+    def __iter__(self):
+        names = self.df['Patient name']
+        year_months = self.df['year_month']
+        for start, end in zip(self.starts, self.ends):
+            yield (names.iat[start], year_months.iat[start]), self.df.iloc[start:end]
 
+    def headers(self) -> list:
+        """Patient details for every group, in iteration order (see patient_headers)."""
+        return patient_headers(self.df.iloc[self.starts])
 
-def transform_group_to_invoice_data(group_df: pd.DataFrame, invoice_number: str, year_month):
-    """Transform grouped DataFrame into invoice data dict."""
-    first_row = group_df.iloc[0]
 
-    data = {
-        'patient_name': first_row['Patient name'],
-        'patient_address': first_row['Patient address'].replace('\n', '<br>'),
-        'patient_cell': first_row['Cell number'],
-        'patient_email': first_row['Email'],
-    }
+def group_by_patient_month(
+    df: pd.DataFrame, month_filter: str = None, profiler: Profiler = None
+) -> PatientMonthGroups:
+    """Group invoice data by patient name and month.
 
-    if pd.notna(first_row['Medical aid name']):
-        data['medical_aid_name'] = first_row['Medical aid name']
-        data['medical_aid_number'] = first_row['Medical aid number']
+    If month_filter ('YYYY-MM') is given, rows from other months are dropped before grouping.
+    """
+    profiler = profiler or Profiler(enabled=False)
 
-    if pd.notna(first_row['Next of kin name']):
-        data['next_of_kin_name'] = first_row['Next of kin name']
-        data['next_of_kin_cell'] = first_row['Next of kin cellphone number']
-        if pd.notna(first_row.get('Next of kin email')):
-            data['next_of_kin_email'] = first_row['Next of kin email']
+    # Parse dates and add year-month column, unless they came parsed from the CSV cache
+    if 'parsed_date' not in df:
+        with profiler.phase('parse_dates'):
+            df['parsed_date'] = parse_dates(df['Date'])
+
+    if month_filter:
+        df = df[in_month(df['parsed_date'], month_filter)]
 
-    if pd.notna(first_row['Second next of kin name']):
-        data['second_next_of_kin_name'] = first_row['Second next of kin name']
-        data['second_next_of_kin_cell'] = first_row['Second next of kin cellphone number']
-        if pd.notna(first_row.get('Second next of kin email')):
-            data['second_next_of_kin_email'] = first_row['Second next of kin email']
+    with profiler.phase('groupby'):
+        df = df.assign(year_month=df['parsed_date'].dt.to_period('M'))
+
+        # Like groupby, leave out rows without a patient name
+        unnamed = df['Patient name'].isna()
+        if unnamed.any():
+            df = df[~unnamed]
+
+        # A stable sort keeps each group's rows in file order, as groupby does
+        df = df.sort_values(['Patient name', 'year_month'], kind='stable', ignore_index=True)
+
+        names = df['Patient name']
+        year_months = df['year_month']
+        boundaries = ((names != names.shift()) | (year_months != year_months.shift())).to_numpy()
+        starts = boundaries.nonzero()[0].tolist()
+        ends = starts[1:] + [len(df)]
+
+        return PatientMonthGroups(df, starts, ends)
+
+
+# Invoice fields taken from a group's first row: (field, column, columns that must all be non-empty)
+PATIENT_HEADER_FIELDS = [
+    ('patient_name', 'Patient name', ()),
+    ('patient_address', 'Patient address', ()),
+    ('patient_cell', 'Cell number', ()),
+    ('patient_email', 'Email', ()),
+    ('medical_aid_name', 'Medical aid name', ('Medical aid name',)),
+    ('medical_aid_number', 'Medical aid number', ('Medical aid name',)),
+    ('next_of_kin_name', 'Next of kin name', ('Next of kin name',)),
+    ('next_of_kin_cell', 'Next of kin cellphone number', ('Next of kin name',)),
+    ('next_of_kin_email', 'Next of kin email', ('Next of kin name', 'Next of kin email')),
+    ('second_next_of_kin_name', 'Second next of kin name', ('Second next of kin name',)),
+    ('second_next_of_kin_cell', 'Second next of kin cellphone number', ('Second next of kin name',)),
+    ('second_next_of_kin_email', 'Second next of kin email', ('Second next of kin name', 'Second next of kin email')),
+]
+
+
+def patient_headers(first_rows: pd.DataFrame) -> list:
+    """Build the patient, medical aid and next-of-kin fields of each invoice from its group's first row.
+
+    The null checks run once per column over all groups; a block is left out of an invoice when its
+    name is empty, so the template shows it only for patients who have one.
+    """
+    columns = [column for _, column, _ in PATIENT_HEADER_FIELDS]
+    rows = first_rows.reindex(columns=columns).astype(object)
+    rows['Patient address'] = rows['Patient address'].str.replace('\n', '<br>', regex=False)
+    present = rows.notna()
+
+    headers = [{} for _ in range(len(rows))]
+    for field, column, required in PATIENT_HEADER_FIELDS:
+        if required:
+            keep = present[list(required)].all(axis=1).to_numpy()
+        else:
+            keep = [True] * len(rows)
+        for header, value, kept in zip(headers, rows[column].to_numpy(), keep):
+            if kept:
+                header[field] = value
+    return headers
+
+
+def transform_group_to_invoice_data(
+    group_df: pd.DataFrame, invoice_number: str, year_month, header: dict = None
+):
+    """Transform grouped DataFrame into invoice data dict.
+
+    header is the group's entry from patient_headers, computed here from the first row if not given.
+    """
+    if header is None:
+        [header] = patient_headers(group_df.iloc[:1])
+    data = dict(header)
 
     # Generate invoice metadata
     data['invoice_number'] = invoice_number
     data['invoice_date'] = datetime.now().strftime("%d %B %Y")
     data['period'] = year_month.strftime("%B %Y")
 
-    line_items = []
-    for _, row in group_df.iterrows():
-        line_items.append({
-            'date': row['Date'],
-            'p_code': row['P. Code'] if pd.notna(row['P. Code']) else '',
-            'icd_code': row['ICD Code'] if pd.notna(row['ICD Code']) else '',
-        })
-
-    data['line_items'] = line_items
+    data['line_items'] = [
+        {'date': date, 'p_code': p_code, 'icd_code': icd_code}
+        for date, p_code, icd_code in zip(
+            group_df['Date'], group_df['P. Code'].astype(object).fillna(''),
+            group_df['ICD Code'].astype(object).fillna('')
+        )
+    ]
 
     return data
 
 
-def generate_invoice(data, template_path: Path, output_path: Path):
-    with open(template_path, 'r') as f:
-        template = Template(f.read())
+# Template variables filled from the practice's .env
+PRACTICE_ENV_VARS = {
+    "doctor_name": "DOCTOR_NAME",
+    "practice_phone": "PRACTICE_PHONE",
+    "practice_email": "PRACTICE_EMAIL",
+    "practice_address": "PRACTICE_ADDRESS",
+    "practice_number": "PRACTICE_NUMBER",
+    "mp_number": "MP_NUMBER",
+    "bank_name": "BANK_NAME",
+    "bank_account": "BANK_ACCOUNT",
+    "bank_code": "BANK_CODE",
+}
+
+
+@dataclass(frozen=True)
+class PracticeSettings:
+    """Practice and bank details printed on every invoice."""
+    doctor_name: str
+    practice_phone: str
+    practice_email: str
+    practice_address: str
+    practice_number: str
+    mp_number: str
+    bank_name: str
+    bank_account: str
+    bank_code: str
+
+    @classmethod
+    def from_env(cls) -> "PracticeSettings":
+        """Read the settings from the environment (and .env), failing if any are missing or empty."""
+        missing = [env_var for env_var in PRACTICE_ENV_VARS.values() if not os.getenv(env_var, '').strip()]
+        if missing:
+            raise InvoiceSettingsError(f"Missing practice details in .env: {', '.join(missing)}")
+        return cls(**{key: os.getenv(env_var).strip() for key, env_var in PRACTICE_ENV_VARS.items()})
+
+
+def load_template(template_path: Path, settings: PracticeSettings = None) -> Template:
+    """Compile the invoice template once, caching its bytecode on disk between runs.
+
+    The practice settings, if given, become template globals so each render only passes patient data.
+    """
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+    cache_dir = Path(os.getcwd()) / ".jinja_cache"
+    cache_dir.mkdir(exist_ok=True)
+
+    env = Environment(
+        loader=FileSystemLoader(str(template_path.parent)),
+        bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+    )
+    return env.get_template(template_path.name, globals=asdict(settings) if settings else None)
+
+
+def load_stylesheets(css_path: Path):
+    """Parse the invoice stylesheet once so every PDF in a run can reuse it."""
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    font_config = FontConfiguration()
+    if not css_path.exists():
+        return None, font_config
+    return [CSS(filename=str(css_path), font_config=font_config)], font_config
+
+
+def render_invoice_html(data, template: Template) -> str:
+    """Fill the template with the invoice data; practice details come from the template globals."""
+    return template.render(**data)
+
+
+def render_invoice_pdf(
+    data, template: Template, stylesheets=None, font_config=None, profiler: Profiler = None, name: str = None
+) -> bytes:
+    """Render one invoice to PDF bytes; name labels its profiler records."""
+    from weasyprint import HTML
+
+    profiler = profiler or Profiler(enabled=False)
+
+    with profiler.phase('jinja_render', name):
+        html_out = render_invoice_html(data, template)
+    with profiler.phase('layout', name):
+        document = HTML(string=html_out).render(stylesheets=stylesheets, font_config=font_config)
+    with profiler.phase('pdf_write', name):
+        return document.write_pdf()
+
+
+class PdfSink(ABC):
+    """Destination for rendered PDFs. Subclasses implement write()."""
+
+    def __init__(self, profiler: Profiler = None):
+        self.profiler = profiler or Profiler(enabled=False)
+
+    @abstractmethod
+    def write(self, output_path: Path, pdf: bytes):
+        """Store one PDF under output_path's name."""
+
+    def land(self, rendered):
+        """Write (output_path, pdf, error) results, yielding (output_path, error) in order as each lands."""
+        for output_path, pdf, error in rendered:
+            if error is None:
+                try:
+                    self.write(output_path, pdf)
+                except Exception as e:
+                    error = e
+            yield output_path, error
 
-    data["doctor_name"] = os.getenv("DOCTOR_NAME")
-    data["practice_phone"] = os.getenv("PRACTICE_PHONE")
-    data["practice_email"] = os.getenv("PRACTICE_EMAIL")
-    data["practice_address"] = os.getenv("PRACTICE_ADDRESS")
-    data["practice_number"] = os.getenv("PRACTICE_NUMBER")
-    data["mp_number"] = os.getenv("MP_NUMBER")
+    def close(self):
+        pass
 
-    data["bank_name"] = os.getenv("BANK_NAME")
-    data["bank_account"] = os.getenv("BANK_ACCOUNT")
-    data["bank_code"] = os.getenv("BANK_CODE")
 
-    html_out = template.render(**data)
+class DirectorySink(PdfSink):
+    """Write each PDF to its own file, optionally flushing several at once from a thread pool."""
 
-    # Check if style.css exists in the same directory as the template
+    def __init__(self, threads: int = 1, fsync: bool = False, profiler: Profiler = None):
+        super().__init__(profiler)
+        self.threads = threads
+        self.fsync = fsync
+
+    def write(self, output_path: Path, pdf: bytes):
+        with self.profiler.phase('disk_write', output_path.name):
+            with open(output_path, 'wb') as f:
+                f.write(pdf)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def land(self, rendered):
+        if self.threads <= 1:
+            yield from super().land(rendered)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            pending = deque()
+            for output_path, pdf, error in rendered:
+                future = pool.submit(self.write, output_path, pdf) if error is None else None
+                pending.append((output_path, future, error))
+
+                # Hand back finished writes in order, holding at most a couple of PDFs per thread
+                while pending and (
+                    len(pending) > 2 * self.threads or pending[0][1] is None or pending[0][1].done()
+                ):
+                    yield self._landed(*pending.popleft())
+
+            while pending:
+                yield self._landed(*pending.popleft())
+
+    @staticmethod
+    def _landed(output_path: Path, future, error):
+        if future is not None:
+            try:
+                future.result()
+            except Exception as e:
+                error = e
+        return output_path, error
+
+
+class ZipSink(PdfSink):
+    """Stream each PDF straight into a ZIP archive, holding only one PDF in memory at a time."""
+
+    def __init__(self, archive_path: Path, profiler: Profiler = None):
+        super().__init__(profiler)
+        # PDF streams are already compressed, so deflating them again gains little
+        self.archive = zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_STORED)
+
+    def write(self, output_path: Path, pdf: bytes):
+        with self.profiler.phase('disk_write', output_path.name):
+            self.archive.writestr(output_path.name, pdf)
+
+    def close(self):
+        self.archive.close()
+
+
+MANIFEST_FILENAME = ".invoice_manifest.json"
+
+
+def load_manifest(output_dir: Path) -> dict:
+    """Load the fingerprint and invoice number recorded for each PDF in output_dir."""
+    manifest_file = output_dir / MANIFEST_FILENAME
+    if manifest_file.exists():
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def update_manifest(output_dir: Path, entries: dict):
+    """Merge entries into the manifest in output_dir, atomically replacing it.
+
+    The manifest is re-read under the counter lock so concurrent runs writing to the same
+    directory do not drop each other's entries.
+    """
+    with _counter_lock():
+        manifest = load_manifest(output_dir)
+        manifest.update(entries)
+        _write_atomic(output_dir / MANIFEST_FILENAME, json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def render_inputs_fingerprint(template_path: Path, settings: PracticeSettings) -> str:
+    """Hash everything besides the patient's rows that affects a rendered invoice."""
+    digest = hashlib.sha256()
+    digest.update(template_path.read_bytes())
     css_path = template_path.parent / 'style.css'
-    stylesheets = [str(css_path)] if css_path.exists() else None
+    if css_path.exists():
+        digest.update(css_path.read_bytes())
+    digest.update(json.dumps(asdict(settings), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def group_fingerprint(group_df: pd.DataFrame, render_fingerprint: str) -> str:
+    """Hash a patient-month group's invoice columns together with the render inputs."""
+    columns = [column for column in INVOICE_COLUMNS if column in group_df]
+    rows = group_df[columns].astype(object).fillna('').to_csv(index=False)
+    return hashlib.sha256((render_fingerprint + rows).encode()).hexdigest()
+
+
+_worker_state = {}
+
+
+def _init_render_worker(template_path: Path, settings: PracticeSettings):
+    """Compile the template and parse style.css once per worker process."""
+    _worker_state['template'] = load_template(template_path, settings)
+    _worker_state['stylesheets'], _worker_state['font_config'] = load_stylesheets(template_path.parent / 'style.css')
+
+
+def _render_in_worker(data, name: str, profile: bool):
+    """Render one invoice in a worker, returning the PDF and its profiler records."""
+    profiler = Profiler(enabled=profile)
+    pdf = render_invoice_pdf(
+        data, _worker_state['template'], _worker_state['stylesheets'], _worker_state['font_config'], profiler, name
+    )
+    return pdf, profiler.records
+
+
+def render_invoices(jobs, template_path: Path, settings: PracticeSettings, profiler: Profiler):
+    """Render (invoice_data, output_path) jobs one after another.
+
+    Yields (output_path, pdf, error) in job order, with error None for invoices that rendered.
+    """
+    # Compile the template and parse style.css once and reuse them for every group
+    template = load_template(template_path, settings)
+    stylesheets, font_config = load_stylesheets(template_path.parent / 'style.css')
+
+    for invoice_data, output_path in jobs:
+        try:
+            pdf = render_invoice_pdf(invoice_data, template, stylesheets, font_config, profiler, output_path.name)
+        except Exception as e:
+            yield output_path, None, e
+        else:
+            yield output_path, pdf, None
+
+
+# Invoices buffered between pipeline stages in --pipeline mode
+PIPELINE_DEPTH = 4
+
+
+async def _run_pipeline(jobs, template: Template, stylesheets, font_config, sink: PdfSink, profiler: Profiler, emit):
+    """Prepare, render and write jobs in three overlapping stages joined by bounded queues.
+
+    While invoice N is being laid out, the HTML for N + 1 is prepared and the PDF of N - 1 is
+    handed to the sink in a thread, so slow disks do not stall rendering. Only one invoice is laid
+    out at a time, as WeasyPrint is not thread-safe. emit is called with (output_path, error) in
+    job order.
+    """
+    import asyncio
 
-    HTML(string=html_out).write_pdf(output_path, stylesheets=stylesheets)
-    print(f"Invoice generated at {output_path}")
+    from weasyprint import HTML
 
+    html_queue = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+    pdf_queue = asyncio.Queue(maxsize=PIPELINE_DEPTH)
 
-def generate_invoices_from_csv(csv_path: Path, output_dir: Path = None, month_filter: str = None):
+    def render_pdf(html_out: str, output_path: Path) -> bytes:
+        with profiler.phase('layout', output_path.name):
+            document = HTML(string=html_out).render(stylesheets=stylesheets, font_config=font_config)
+        with profiler.phase('pdf_write', output_path.name):
+            return document.write_pdf()
+
+    async def prepare():
+        for invoice_data, output_path in jobs:
+            with profiler.phase('jinja_render', output_path.name):
+                html_out = render_invoice_html(invoice_data, template)
+            await html_queue.put((output_path, html_out))
+        await html_queue.put(None)
+
+    async def render():
+        while (item := await html_queue.get()) is not None:
+            output_path, html_out = item
+            try:
+                pdf = await asyncio.to_thread(render_pdf, html_out, output_path)
+            except Exception as e:
+                # Failures travel down the pipeline so results stay in job order
+                await pdf_queue.put((output_path, None, e))
+            else:
+                await pdf_queue.put((output_path, pdf, None))
+        await pdf_queue.put(None)
+
+    async def write():
+        while (item := await pdf_queue.get()) is not None:
+            output_path, pdf, error = item
+            if error is None:
+                try:
+                    await asyncio.to_thread(sink.write, output_path, pdf)
+                except Exception as e:
+                    error = e
+            emit((output_path, error))
+
+    await asyncio.gather(prepare(), render(), write())
+
+
+def render_invoices_pipelined(
+    jobs, template_path: Path, settings: PracticeSettings, sink: PdfSink, profiler: Profiler
+):
+    """Render (invoice_data, output_path) jobs through the overlapping pipeline in _run_pipeline.
+
+    The pipeline runs its own event loop in a background thread; yields (output_path, error) in
+    job order as each PDF lands in the sink.
+    """
+    template = load_template(template_path, settings)
+    stylesheets, font_config = load_stylesheets(template_path.parent / 'style.css')
+
+    results = queue.Queue()
+    done = object()
+
+    def run():
+        import asyncio
+
+        try:
+            asyncio.run(_run_pipeline(jobs, template, stylesheets, font_config, sink, profiler, results.put))
+        except BaseException as e:
+            results.put(e)
+        results.put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while (result := results.get()) is not done:
+        if isinstance(result, BaseException):
+            raise result
+        yield result
+    thread.join()
+
+
+def render_combined_pdf(jobs, template_path: Path, settings: PracticeSettings, profiler: Profiler) -> bytes:
+    """Render (invoice_data, output_path) jobs into a single PDF.
+
+    Each invoice is laid out as its own document, so its "Page x of y" counters restart, and the
+    pages are then written out together in one PDF. All documents share one FontConfiguration, so
+    fonts are resolved once, and the merged document collects the fonts of every page into a single
+    dictionary, so each font file is subset and embedded once for the whole batch rather than once
+    per invoice.
+    """
+    from weasyprint import HTML
+
+    template = load_template(template_path, settings)
+    stylesheets, font_config = load_stylesheets(template_path.parent / 'style.css')
+
+    documents = []
+    for invoice_data, output_path in jobs:
+        with profiler.phase('jinja_render', output_path.name):
+            html_out = render_invoice_html(invoice_data, template)
+        with profiler.phase('layout', output_path.name):
+            documents.append(HTML(string=html_out).render(stylesheets=stylesheets, font_config=font_config))
+
+    with profiler.phase('pdf_write'):
+        pages = [page for document in documents for page in document.pages]
+        return documents[0].copy(pages).write_pdf()
+
+
+def render_invoices_parallel(
+    jobs, template_path: Path, settings: PracticeSettings, workers: int, profiler: Profiler
+):
+    """Render (invoice_data, output_path) jobs across a process pool.
+
+    Yields (output_path, pdf, error) in job order, with error None for invoices that rendered. At
+    most a couple of jobs per worker are in flight, so finished PDFs do not pile up in memory while
+    earlier ones are still being written.
+    """
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_render_worker, initargs=(template_path, settings)
+    ) as executor:
+        pending = deque()
+        for data, output_path in jobs:
+            future = executor.submit(_render_in_worker, data, output_path.name, profiler.enabled)
+            pending.append((output_path, future))
+            if len(pending) >= 2 * workers:
+                yield _collect_render(*pending.popleft(), profiler)
+
+        while pending:
+            yield _collect_render(*pending.popleft(), profiler)
+
+
+def _collect_render(output_path: Path, future, profiler: Profiler):
+    """Wait for a worker's render, returning (output_path, pdf, error)."""
+    try:
+        pdf, records = future.result()
+    except Exception as e:
+        return output_path, None, e
+    profiler.records.extend(records)
+    return output_path, pdf, None
+
+
+def generate_invoices_from_csv(
+    csv_path: Path,
+    output_dir: Path = None,
+    month_filter: str = None,
+    workers: int = 1,
+    chunksize: int = None,
+    csv_engine: str = 'c',
+    csv_cache: bool = False,
+    incremental: bool = False,
+    combined: bool = False,
+    pipeline: bool = False,
+    write_threads: int = 1,
+    fsync: bool = False,
+    archive: Path = None,
+    profile: bool = False,
+    profile_json: Path = None,
+):
     """Generate multiple invoices from CSV, grouped by patient and month.
 
     Args:
         csv_path: Path to the CSV file
         output_dir: Directory to save PDFs (default: output/)
         month_filter: Optional filter in format 'YYYY-MM' (e.g., '2025-11') to only generate invoices for that month
+        workers: Number of processes to render PDFs with (default: 1, render serially)
+        chunksize: Stream the CSV in chunks of this many rows, keeping only the rows for month_filter
+        csv_engine: CSV parser to use, 'c' (pandas, default) or 'pyarrow'
+        csv_cache: Reuse the parsed CSV from a Parquet cache in .invoice_cache/ while the file is unchanged
+        incremental: Only re-render groups whose rows, template, stylesheet or practice details changed
+            since the last incremental run, reusing their previously issued invoice numbers
+        combined: Write every invoice into one PDF (invoices_<month>.pdf) instead of one file per invoice
+        pipeline: Overlap HTML preparation, PDF rendering and writing of consecutive invoices
+        write_threads: Number of threads writing finished PDFs to output_dir in parallel (default: 1)
+        fsync: Flush each PDF to disk before it is reported as generated
+        archive: Stream the PDFs into this ZIP file instead of writing them to output_dir
+        profile: Print wall-clock and CPU time per phase and the slowest invoices at the end
+        profile_json: Also write the raw per-phase, per-invoice timings to this JSON file
     """
     # Set default output directory
     if output_dir is None:
         output_dir = Path(os.getcwd()) / "output"
 
     # Ensure output directory exists
-    output_dir.mkdir(exist_ok=True)
+    if archive is None:
+        output_dir.mkdir(exist_ok=True)
+
+    # Fail before reading the CSV rather than printing "None" on every invoice
+    settings = PracticeSettings.from_env()
+
+    profiler = Profiler(enabled=profile or profile_json is not None)
+
+    # Import pandas before timing starts so its import is not counted as reading the CSV
+    import pandas  # noqa: F401
 
     # Read and group data
-    df = read_invoice(csv_path)
-    groups = group_by_patient_month(df)
+    if csv_cache:
+        df = read_invoice_cached(csv_path, csv_engine, profiler)
+    else:
+        with profiler.phase('read_csv'):
+            df = read_invoice(csv_path, month_filter, chunksize, csv_engine)
+    groups = group_by_patient_month(df, month_filter, profiler)
+    # The groups hold their own sorted copy of the rows
+    del df
 
-    # Filter by month if specified
-    if month_filter:
-        groups = [(key, group) for key, group in groups if str(key[1]) == month_filter]
-        if not groups:
-            print(f"No data found for month {month_filter}")
-            return
+    if month_filter and not groups:
+        print(f"No data found for month {month_filter}")
+        return
 
     print(f"Found {len(groups)} patient-month group(s)")
 
-    # Get starting invoice number
-    current_invoice_num = get_next_invoice_number()
-    print(f"Starting from invoice number: INV-{current_invoice_num:04d}")
-
-    # Generate invoice for each group
     template_path = Path('invoice_template.html')
 
-    for (patient_name, year_month), group_df in groups:
-        # Generate sequential invoice number
-        invoice_number = f"INV-{current_invoice_num:04d}"
+    # Invoices already in the manifest keep their number in every mode; in incremental mode,
+    # groups whose fingerprint also matches are left alone
+    manifest = load_manifest(output_dir)
+    render_fingerprint = render_inputs_fingerprint(template_path, settings)
+    fingerprints = {}
+    unchanged = 0
+
+    # Decide which groups need rendering and which already have an invoice number
+    planned = []
+    with profiler.phase('headers'):
+        headers = groups.headers()
+    for ((patient_name, year_month), group_df), header in zip(groups, headers):
+        output_filename = invoice_filename(patient_name, year_month)
+
+        previous = manifest.get(output_filename)
+        # New invoices are fingerprinted too, as their fingerprints identify the run (see run_key)
+        if incremental or not previous:
+            fingerprint = group_fingerprint(group_df, render_fingerprint)
+            if previous and previous['fingerprint'] == fingerprint and (output_dir / output_filename).exists():
+                unchanged += 1
+                continue
+            fingerprints[output_filename] = fingerprint
+
+        # Re-rendered invoices keep the number they were first issued with
+        invoice_number = previous['invoice_number'] if previous else None
+        planned.append((year_month, group_df, header, output_filename, invoice_number))
+
+    # Reserve numbers for the new invoices up front so numbering does not depend on render order
+    new_filenames = [
+        output_filename for _, _, _, output_filename, invoice_number in planned if invoice_number is None
+    ]
+    # A re-run resumes an interrupted run only if its new invoices have the same rows, so files the
+    # interrupted attempt issued are never kept once their data has changed
+    run_key = hashlib.sha256("\n".join([
+        str(output_dir.resolve()),
+        *(f"{output_filename} {fingerprints[output_filename]}" for output_filename in new_filenames),
+    ]).encode()).hexdigest()
+    reservation = reserve_invoice_numbers(run_key, len(new_filenames))
+    if reservation.count:
+        print(f"Starting from invoice number: INV-{reservation.start:04d}")
+    if reservation.resumed:
+        print(f"Resuming interrupted run: {len(reservation.issued)} invoice(s) already issued")
+
+    # Number every invoice now, but build its data only when the renderer asks for it
+    to_render = []
+    invoice_numbers = {}
+    new_numbers = {}
+    landed = {}
+    current_invoice_num = reservation.start
+    for year_month, group_df, header, output_filename, invoice_number in planned:
+        if invoice_number is None:
+            # Generate sequential invoice number
+            invoice_number = f"INV-{current_invoice_num:04d}"
+            new_numbers[output_filename] = current_invoice_num
+            current_invoice_num += 1
+
+            # Invoices journaled by an interrupted attempt at this run are already on disk; a combined
+            # PDF or an archive still needs them, so those re-render them with their reserved numbers
+            if (
+                not combined and archive is None and new_numbers[output_filename] in reservation.issued
+                and (output_dir / output_filename).exists()
+            ):
+                landed[output_filename] = invoice_number
+                continue
+
+        invoice_numbers[output_filename] = invoice_number
+        to_render.append((year_month, group_df, header, output_filename, invoice_number))
+    del planned
 
-        # Transform to invoice data
-        invoice_data = transform_group_to_invoice_data(group_df, invoice_number, year_month)
+    def jobs():
+        """Yield (invoice_data, output_path) for each invoice to render, transforming it on demand."""
+        for year_month, group_df, header, output_filename, invoice_number in to_render:
+            if output_filename in new_numbers:
+                record_issuing_number(reservation, new_numbers[output_filename], output_filename)
+            with profiler.phase('transform', output_filename):
+                invoice_data = transform_group_to_invoice_data(group_df, invoice_number, year_month, header)
+            yield invoice_data, output_dir / output_filename
 
-        # Generate output filename
-        safe_name = sanitize_filename(patient_name)
-        ym_str = str(year_month).replace('-', '_')
-        output_filename = f"invoice_{safe_name}_{ym_str}.pdf"
-        output_path = output_dir / output_filename
+    if archive is not None:
+        sink = ZipSink(archive, profiler=profiler)
+    else:
+        sink = DirectorySink(threads=write_threads, fsync=fsync, profiler=profiler)
 
-        # Generate PDF
-        generate_invoice(invoice_data, template_path, output_path)
-        print(f"  Generated: {output_filename}")
-        current_invoice_num += 1
+    combined_path = output_dir / f"invoices_{(month_filter or 'all').replace('-', '_')}.pdf"
+    failures = []
+    try:
+        if combined and to_render:
+            # The combined PDF lands whole or not at all, so one error fails every invoice in it
+            try:
+                pdf = render_combined_pdf(jobs(), template_path, settings, profiler)
+                [(_, error)] = sink.land([(combined_path, pdf, None)])
+            except Exception as e:
+                error = e
+            results = [(output_dir / output_filename, error) for *_, output_filename, _ in to_render]
+        elif pipeline:
+            results = render_invoices_pipelined(jobs(), template_path, settings, sink, profiler)
+        elif workers > 1:
+            results = sink.land(render_invoices_parallel(jobs(), template_path, settings, workers, profiler))
+        else:
+            results = sink.land(render_invoices(jobs(), template_path, settings, profiler))
 
-    save_invoice_number(current_invoice_num)
-    print(f"\nCompleted: {len(groups)} invoice(s) in {output_dir}")
+        for output_path, error in results:
+            if error is not None:
+                failures.append((output_path, error))
+                print(f"  Failed: {output_path.name}")
+                continue
+
+            if not combined:
+                print(f"  Generated: {output_path.name}")
+            landed[output_path.name] = invoice_numbers[output_path.name]
+            if output_path.name in new_numbers:
+                record_issued_number(reservation, new_numbers[output_path.name], output_path.name)
+    except BaseException:
+        release_reservation(reservation)
+        raise
+    finally:
+        sink.close()
+
+    if combined and to_render and not failures:
+        print(f"  Generated: {combined_path.name} ({len(to_render)} invoice(s))")
+
+    # Failed invoices keep the reservation open so a re-run resumes with the same numbers
+    if not failures:
+        complete_reservation(reservation)
+    else:
+        release_reservation(reservation)
+
+    if incremental:
+        update_manifest(output_dir, {
+            output_filename: {'fingerprint': fingerprints[output_filename], 'invoice_number': invoice_number}
+            for output_filename, invoice_number in landed.items()
+        })
+    elif archive is None and landed:
+        # Record the numbers so later runs reuse them, without a fingerprint so the next incremental
+        # run re-renders these invoices (keeping their numbers) rather than trusting old entries.
+        # An archive run leaves the output directory untouched, so it has nowhere to record them.
+        update_manifest(output_dir, {
+            output_filename: {'fingerprint': None, 'invoice_number': invoice_number}
+            for output_filename, invoice_number in landed.items()
+        })
+
+    if failures:
+        print(f"\nFailed: {len(failures)} invoice(s)")
+        for output_path, error in failures:
+            print(f"  {output_path.name}: {error}")
+    if unchanged:
+        print(f"\nSkipped: {unchanged} unchanged invoice(s)")
+    print(f"\nCompleted: {len(to_render) - len(failures)} invoice(s) in {archive or output_dir}")
+
+    if profile:
+        print(f"\n{profiler.summary()}")
+    if profile_json is not None:
+        profiler.write_json(profile_json)
+        print(f"\nProfile written to {profile_json}")
+
+
+class InvoiceService:
+    """Warm state for --serve: the compiled template, parsed stylesheet, fonts and grouped CSV.
+
+    The CSV is re-read whenever its modification time changes. Requests are rendered one at a time,
+    as WeasyPrint is not thread-safe.
+    """
+
+    def __init__(self, csv_path: Path, output_dir: Path, csv_engine: str = 'c'):
+        self.csv_path = csv_path
+        self.output_dir = output_dir
+        self.csv_engine = csv_engine
+        self.output_dir.mkdir(exist_ok=True)
+
+        self.settings = PracticeSettings.from_env()
+        template_path = Path('invoice_template.html')
+        self.template = load_template(template_path, self.settings)
+        self.stylesheets, self.font_config = load_stylesheets(template_path.parent / 'style.css')
+        self.render_fingerprint = render_inputs_fingerprint(template_path, self.settings)
+
+        # Lay out an empty page so fonts are resolved before the first request rather than during it
+        from weasyprint import HTML
+        HTML(string='').render(stylesheets=self.stylesheets, font_config=self.font_config)
+
+        self.lock = threading.Lock()
+        self.csv_mtime = None
+        self.groups = {}
+        self.reload()
+
+    def reload(self):
+        """Re-read and group the CSV if it changed since it was last loaded."""
+        mtime = self.csv_path.stat().st_mtime_ns
+        if mtime == self.csv_mtime:
+            return
+
+        groups = group_by_patient_month(read_invoice(self.csv_path, engine=self.csv_engine))
+        self.groups = {
+            (patient_name, str(year_month)): (year_month, group_df, header)
+            for ((patient_name, year_month), group_df), header in zip(groups, groups.headers())
+        }
+        self.csv_mtime = mtime
+        print(f"Loaded {len(self.groups)} patient-month group(s) from {self.csv_path}")
+
+    def render(self, patient_name: str, month: str):
+        """Render and save one patient's invoice for month ('YYYY-MM'), returning (filename, pdf).
+
+        The invoice keeps the number recorded in the output directory's manifest, or is issued the
+        next number; the manifest is updated as in an --incremental run. Returns None if the patient
+        has no visits that month.
+        """
+        with self.lock:
+            self.reload()
+            entry = self.groups.get((patient_name, month))
+            if entry is None:
+                return None
+            year_month, group_df, header = entry
+
+            output_filename = invoice_filename(patient_name, year_month)
+            previous = load_manifest(self.output_dir).get(output_filename)
+            reservation = None
+            if previous:
+                invoice_number = previous['invoice_number']
+            else:
+                run_key = hashlib.sha256(
+                    "\n".join([str(self.output_dir.resolve()), output_filename]).encode()
+                ).hexdigest()
+                reservation = reserve_invoice_numbers(run_key, 1)
+                invoice_number = f"INV-{reservation.start:04d}"
+
+            try:
+                if reservation is not None:
+                    record_issuing_number(reservation, reservation.start, output_filename)
+                invoice_data = transform_group_to_invoice_data(group_df, invoice_number, year_month, header)
+                pdf = render_invoice_pdf(invoice_data, self.template, self.stylesheets, self.font_config)
+                DirectorySink(fsync=True).write(self.output_dir / output_filename, pdf)
+
+                if reservation is not None:
+                    record_issued_number(reservation, reservation.start, output_filename)
+                    complete_reservation(reservation)
+            finally:
+                # A failed render leaves the reservation open for the next request to resume
+                if reservation is not None:
+                    release_reservation(reservation)
+            update_manifest(self.output_dir, {output_filename: {
+                'fingerprint': group_fingerprint(group_df, self.render_fingerprint),
+                'invoice_number': invoice_number,
+            }})
+            return output_filename, pdf
+
+
+def _remove_stale_socket(socket_path: Path):
+    """Remove a socket left behind by a server that is no longer running.
+
+    Raises FileExistsError if socket_path is not a socket or a live server is still listening on it.
+    """
+    import socket
+
+    try:
+        mode = socket_path.lstat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(str(socket_path))
+        except ConnectionRefusedError:
+            socket_path.unlink()
+            return
+    raise FileExistsError(f"Another server is already listening on {socket_path}")
+
+
+def serve_invoices(service: InvoiceService, port: int = 8765, socket_path: Path = None):
+    """Serve GET /invoice?patient=<name>&month=<YYYY-MM> on localhost:port or a Unix socket.
+
+    Responds with the invoice PDF, 404 if the patient has no visits that month.
+    """
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import parse_qs, quote, urlsplit
+
+    class InvoiceRequestHandler(BaseHTTPRequestHandler):
+        # Status lines and headers are sent as Latin-1, so only fixed ASCII text goes into errors;
+        # patient names, which may be any Unicode or contain CR/LF, never reach them
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != '/invoice':
+                self.send_error(404, "Use /invoice?patient=<name>&month=<YYYY-MM>")
+                return
+
+            query = parse_qs(url.query)
+            patient_name = query.get('patient', [''])[0]
+            month = query.get('month', [''])[0]
+            if not patient_name or not month:
+                self.send_error(400, "Both patient and month are required")
+                return
+
+            try:
+                result = service.render(patient_name, month)
+            except Exception as e:
+                self.log_error("Rendering %r for %s failed: %r", patient_name, month, e)
+                self.send_error(500, "The invoice could not be rendered")
+                return
+            if result is None:
+                self.send_error(404, "The patient has no visits in that month")
+                return
+
+            output_filename, pdf = result
+            # Plain-ASCII fallback name for old clients, the exact name as RFC 5987 UTF-8 for the rest
+            ascii_filename = re.sub(r'[^\x20-\x7e]|["\\]', '_', output_filename)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(len(pdf)))
+            self.send_header(
+                'Content-Disposition',
+                f"inline; filename=\"{ascii_filename}\"; filename*=UTF-8''{quote(output_filename, safe='')}"
+            )
+            self.end_headers()
+            self.wfile.write(pdf)
+
+        def address_string(self):
+            # Unix socket clients have no address to log
+            if socket_path is not None:
+                return str(socket_path)
+            return super().address_string()
+
+    if socket_path is not None:
+        # Only ever remove a dead server's socket, never a live one or a file at a mistyped path
+        _remove_stale_socket(socket_path)
+        server = socketserver.UnixStreamServer(str(socket_path), InvoiceRequestHandler)
+        socket_inode = socket_path.lstat().st_ino
+        print(f"Serving invoices on unix socket {socket_path}")
+    else:
+        server = HTTPServer(('127.0.0.1', port), InvoiceRequestHandler)
+        print(f"Serving invoices on http://127.0.0.1:{port}/invoice?patient=<name>&month=<YYYY-MM>")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Leave the path alone if it has since been replaced, e.g. by another server
+        if socket_path is not None:
+            try:
+                if socket_path.lstat().st_ino == socket_inode:
+                    socket_path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _month_argument(value: str) -> str:
+    try:
+        return validate_month(value)
+    except InvoiceDataError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 def main():
@@ -198,6 +1506,7 @@ def main():
         '--month',
         nargs='?',
         default=datetime.now().strftime("%Y-%m"),
+        type=_month_argument,
         help='Month to generate invoices for in YYYY-MM format (default: current month)'
     )
     parser.add_argument(
@@ -212,11 +1521,147 @@ def main():
         type=Path,
         help='Output directory for PDFs (default: output/)'
     )
+    parser.add_argument(
+        '--workers',
+        default=1,
+        type=int,
+        help='Number of processes to render PDFs with (default: 1)'
+    )
+    parser.add_argument(
+        '--chunksize',
+        default=None,
+        type=int,
+        help='Stream the CSV in chunks of this many rows, keeping only rows for --month (for very large exports)'
+    )
+    parser.add_argument(
+        '--csv-engine',
+        default='c',
+        choices=['c', 'pyarrow'],
+        help='CSV parser: pandas C parser (default) or the multithreaded pyarrow reader'
+    )
+    parser.add_argument(
+        '--csv-cache',
+        action='store_true',
+        help='Cache the parsed CSV in .invoice_cache/ and reuse it while the file is unchanged (needs pyarrow)'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Only re-render invoices whose inputs changed since the last incremental run'
+    )
+    parser.add_argument(
+        '--combined',
+        action='store_true',
+        help='Write all invoices into a single PDF for printing instead of one PDF per invoice'
+    )
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Overlap preparing, rendering and writing consecutive invoices (helps on slow or network disks)'
+    )
+    parser.add_argument(
+        '--write-threads',
+        default=1,
+        type=int,
+        help='Number of threads writing finished PDFs in parallel (helps on network filesystems, default: 1)'
+    )
+    parser.add_argument(
+        '--fsync',
+        action='store_true',
+        help='Flush each PDF to disk before reporting it as generated'
+    )
+    parser.add_argument(
+        '--archive',
+        default=None,
+        type=Path,
+        help='Stream the PDFs into this ZIP file instead of writing them to the output directory'
+    )
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Keep the template, stylesheet and CSV loaded and render single invoices on request'
+    )
+    parser.add_argument(
+        '--port',
+        default=8765,
+        type=int,
+        help='Localhost port for --serve (default: 8765)'
+    )
+    parser.add_argument(
+        '--socket',
+        default=None,
+        type=Path,
+        help='Serve on this Unix socket instead of a localhost port'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print time spent per phase (CSV read, date parsing, grouping, rendering, PDF write) and the slowest invoices'
+    )
+    parser.add_argument(
+        '--profile-json',
+        default=None,
+        type=Path,
+        help='Write per-phase, per-invoice timings to this JSON file'
+    )
 
     args = parser.parse_args()
 
+    if args.combined and (args.incremental or args.workers > 1):
+        parser.error('--combined cannot be used with --incremental or --workers')
+    if args.archive and args.incremental:
+        parser.error('--archive cannot be used with --incremental')
+    if args.pipeline and (args.combined or args.workers > 1):
+        parser.error('--pipeline cannot be used with --combined or --workers')
+    if args.pipeline and args.write_threads > 1:
+        parser.error('--pipeline cannot be used with --write-threads')
+    if args.fsync and args.archive:
+        parser.error('--fsync cannot be used with --archive')
+    if args.csv_engine == 'pyarrow':
+        if args.chunksize is not None:
+            parser.error('--chunksize cannot be used with --csv-engine pyarrow')
+        if importlib.util.find_spec('pyarrow') is None:
+            parser.error('--csv-engine pyarrow requires the pyarrow package (pip install pyarrow)')
+    if args.serve and (args.combined or args.pipeline or args.archive or args.workers > 1 or args.chunksize):
+        parser.error('--serve cannot be used with --combined, --pipeline, --archive, --workers or --chunksize')
+    if args.csv_cache:
+        if args.chunksize is not None:
+            parser.error('--csv-cache cannot be used with --chunksize')
+        if importlib.util.find_spec('pyarrow') is None:
+            parser.error('--csv-cache requires the pyarrow package (pip install pyarrow)')
+
+    if args.serve:
+        try:
+            service = InvoiceService(args.csv, args.output or Path(os.getcwd()) / "output", args.csv_engine)
+        except (InvoiceDataError, InvoiceSettingsError) as e:
+            raise SystemExit(f"Error: {e}")
+        try:
+            serve_invoices(service, port=args.port, socket_path=args.socket)
+        except FileExistsError as e:
+            raise SystemExit(f"Error: {e}")
+        return
+
     print(f"Generating invoices for month: {args.month}")
-    generate_invoices_from_csv(args.csv, output_dir=args.output, month_filter=args.month)
+    try:
+        generate_invoices_from_csv(
+            args.csv,
+            output_dir=args.output,
+            month_filter=args.month,
+            workers=args.workers,
+            chunksize=args.chunksize,
+            csv_engine=args.csv_engine,
+            csv_cache=args.csv_cache,
+            incremental=args.incremental,
+            combined=args.combined,
+            pipeline=args.pipeline,
+            write_threads=args.write_threads,
+            fsync=args.fsync,
+            archive=args.archive,
+            profile=args.profile,
+            profile_json=args.profile_json,
+        )
+    except (InvoiceDataError, InvoiceCounterError, InvoiceSettingsError) as e:
+        raise SystemExit(f"Error: {e}")
 
 
 if __name__ == "__main__":